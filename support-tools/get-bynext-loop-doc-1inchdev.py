@@ -1,9 +1,15 @@
 # get-bynext-loop-doc-1inchdev.py
-from playwright.sync_api import sync_playwright
-import os
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+import asyncio
+import hashlib
+import json
 import re
-from PyPDF2 import PdfMerger
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from pypdf import PdfWriter
 BASE_URL = "https://portal.1inch.dev/documentation/apis/authentication"
 STARTNUMBER = 1  # 開始ページ番号
 BASE_URL = "https://portal.1inch.dev/documentation/apis/swap/fusion-plus/swagger/quoter?method=post&path=%2Fv1.0%2Fquote%2Fbuild"
@@ -23,138 +29,627 @@ STARTNUMBER = 134
 BASE_URL = "https://portal.1inch.dev/documentation/apis/token-details/swagger?method=get&path=%2Fv1.0%2Fprices%2Fchange%2F%7Bchain%7D%2F%7BtokenAddress%7D"
 STARTNUMBER = 191
 
-OUTPUT_DIR = "1inch_docs"
+OUTPUT_DIR = Path("1inch_docs")
 MERGED_PDF_PATH = "1inch_full_documentation.pdf"
+_UNSAFE_FN_RE = re.compile(r'[\\/:*?"<>|]')  # ファイル名に使えない文字
+MAX_CONCURRENT = 4  # 同時に処理するページ数
+JITTER = 0.3  # 最初のページ群の開始をずらす秒数
+RECYCLE_EVERY = 50  # このページ数ごとにBrowserContextを作り直す
+MANIFEST_NAME = "manifest.json"  # output_dir内の {url: {hash, title, files}} 記録
+SSR_MIN_BYTES = 5000  # これより短いHTMLはJSで描画される空のシェルとみなす
+URL_CACHE_PATH = Path.home() / ".cache" / "1inch-docs" / "urls.json"
+URL_CACHE_TTL = 86400  # URL一覧キャッシュの有効秒数
+NAVIGATION_TIMEOUT = 3000  # goto(wait_until="commit")のタイムアウト（ミリ秒）
+FIRST_NAVIGATION_TIMEOUT = 30000  # 最初のbase_url読み込みと、遅かったページのやり直しで待つ時間
+CONTENT_TIMEOUT = 10000  # 本文描画待ちのタイムアウト（ミリ秒）
+# 各ドキュメントページの本文下にあるページ送り。これが出れば本文は描画済み
+CONTENT_SELECTOR = "dev-portal-documentation-pagination"
+# ポップアップのXボタン
+POPUP_CLOSE_SELECTOR = "#cdk-overlay-2 div.text-day-static-white.absolute.right-0.top-0.cursor-pointer.p-3.hover\\:opacity-50.ng-tns-c3156289045-3"
+# block_media=Trueの時に止めるリソース（テキスト抽出には不要）
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+# 解析系ドメイン。routeを使うとHTTPキャッシュが無効になるので、名前解決で止める
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "hotjar.com",
+    "segment.io",
+    "mixpanel.com",
+)
+LAUNCH_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--host-resolver-rules=" + ", ".join(
+        f"MAP {host} ~NOTFOUND, MAP *.{host} ~NOTFOUND" for host in BLOCKED_HOSTS
+    ),
+]
+# Chromiumは1回だけ起動して全クロールで共有する
+_playwright = None
+_browser = None
+_browser_lock = asyncio.Lock()
+async def get_browser(headless: bool = False, slow_mo: int = 500):
+    """
+    共有Chromiumを返す。未起動または切断されていれば起動し直す。
+    """
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is not None and _browser.is_connected():
+            return _browser
+        if _playwright is None:
+            _playwright = await async_playwright().start()
+        _browser = await _playwright.chromium.launch(headless=headless, slow_mo=slow_mo, args=LAUNCH_ARGS)
+        return _browser
+async def close_browser():
+    """
+    共有Chromiumとplaywrightを終了する。
+    """
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is not None:
+            await _browser.close()
+            _browser = None
+        if _playwright is not None:
+            await _playwright.stop()
+            _playwright = None
+class PagePool:
+    """
+    BrowserContextのページを貸し出すプール。
+    コンテキストは最初のacquireで作り、ブラウザが切断されていれば作り直す。
+    reuse_pages=Trueなら返却されたページを次のURLで使い回す。
+    recycle_everyページごとにコンテキストを作り直し、Playwrightが溜め込む
+    request/responseオブジェクトを解放する（Cookieは引き継ぐ）。
+    """
+    def __init__(self, browser_factory, reuse_pages: bool = True, context_setup=None,
+                 recycle_every: int = None, **context_options):
+        self._browser_factory = browser_factory
+        self._reuse_pages = reuse_pages
+        self._context_setup = context_setup
+        self._recycle_every = recycle_every
+        self._context_options = context_options
+        self._ctx = None
+        # 並行したacquireが別々にnew_contextして孤児コンテキストが残らないようにする
+        self._ctx_lock = asyncio.Lock()
+        self._idle = []
+        self._served = 0  # 現在のコンテキストで貸し出したページ数
+        self._in_use = {}  # コンテキストごとの貸し出し中ページ数
+        self._retiring = set()  # 貸し出し中ページが返ったら閉じるコンテキスト
+    async def _retire_context(self):
+        old_ctx = self._ctx
+        self._context_options["storage_state"] = await old_ctx.storage_state()
+        self._ctx = None
+        self._idle.clear()
+        self._served = 0
+        if self._in_use.get(old_ctx, 0) == 0:
+            self._in_use.pop(old_ctx, None)
+            await old_ctx.close()
+        else:
+            self._retiring.add(old_ctx)
+    def _drop_disconnected(self):
+        # ブラウザごと落ちたコンテキストは閉じられないので、管理から外すだけにする
+        for ctx in [self._ctx, *self._retiring]:
+            if not ctx.browser.is_connected():
+                self._in_use.pop(ctx, None)
+                self._retiring.discard(ctx)
+        self._ctx = None
+    async def _get_context(self):
+        async with self._ctx_lock:
+            if (self._ctx is not None and self._recycle_every
+                    and self._served >= self._recycle_every and self._ctx.browser.is_connected()):
+                print(f"♻️ Recycling browser context after {self._served} pages")
+                await self._retire_context()
+            if self._ctx is None or not self._ctx.browser.is_connected():
+                if self._ctx is not None:
+                    self._drop_disconnected()
+                self._idle.clear()
+                self._served = 0
+                browser = await self._browser_factory()
+                self._ctx = await browser.new_context(**self._context_options)
+                if self._context_setup is not None:
+                    await self._context_setup(self._ctx)
+            return self._ctx
+    async def warm_up(self, count: int = 3):
+        """
+        コンテキストとcount枚のページを先に並列で用意しておく
+        """
+        ctx = await self._get_context()
+        missing = max(0, count - len(self._idle))
+        pages = await asyncio.gather(*[ctx.new_page() for _ in range(missing)])
+        self._idle.extend(pages)
+    @asynccontextmanager
+    async def acquire(self):
+        ctx = await self._get_context()
+        self._served += 1
+        self._in_use[ctx] = self._in_use.get(ctx, 0) + 1
+        page = None
+        try:
+            page = self._idle.pop() if self._idle else await ctx.new_page()
+            yield page
+        finally:
+            await self._release(ctx, page)
+    async def _release(self, ctx, page):
+        if ctx not in self._in_use:
+            # close()済み、またはブラウザ切断で管理から外したコンテキストのページ
+            return
+        self._in_use[ctx] -= 1
+        if ctx in self._retiring:
+            if self._in_use[ctx] == 0:
+                self._retiring.discard(ctx)
+                del self._in_use[ctx]
+                try:
+                    await ctx.close()
+                except Exception as e:
+                    print(f"Context close failed, ignoring: {e}")
+        elif page is None or page.is_closed():
+            return
+        elif self._reuse_pages and ctx is self._ctx:
+            self._idle.append(page)
+        else:
+            try:
+                await page.close()
+            except Exception as e:
+                print(f"Page close failed, ignoring: {e}")
+    async def close(self):
+        async with self._ctx_lock:
+            self._idle.clear()
+            for ctx in [self._ctx, *self._retiring]:
+                if ctx is not None:
+                    try:
+                        await ctx.close()
+                    except Exception as e:
+                        print(f"Context close failed, ignoring: {e}")
+            self._ctx = None
+            self._retiring.clear()
+            self._in_use.clear()
+async def configure_context(context, block_media: bool = False):
+    """
+    クロール用コンテキストの共通設定
+    """
+    context.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
+    if block_media:
+        await block_media_requests(context)
+async def block_media_requests(context):
+    """
+    画像・フォント・動画のリクエストを止める。
+    routeを登録するとコンテキストのHTTPキャッシュが無効になるので、block_mediaの時だけ使う。
+    """
+    async def handler(route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+    await context.route("**/*", handler)
 def safe_filename(name: str) -> str:
-    return re.sub(r'[\\/:*?"<>|]', '_', name)
-def scroll_to_bottom(page, step=800, delay=0.2):
+    return _UNSAFE_FN_RE.sub('_', name)
+async def scroll_to_bottom(page, delay=0.25, timeout=10):
     """
-    ページを少しずつスクロールしてLazy Loadコンテンツを全て表示させる
+    ページ最下部までスクロールしてLazy Loadコンテンツを全て表示させる。
+    scrollHeightが伸びなくなるか、timeout秒経過したら終了する。
     """
     script = """
-        async ({step, delay}) => {
+        async ({delay, timeout}) => {
             const sleep = ms => new Promise(r => setTimeout(r, ms));
-            let totalHeight = 0;
-            const distance = step;
-            while (totalHeight < document.body.scrollHeight) {
-                window.scrollBy(0, distance);
-                totalHeight += distance;
+            const start = Date.now();
+            let last = -1;
+            while (Date.now() - start < timeout * 1000) {
+                window.scrollTo(0, document.body.scrollHeight);
                 await sleep(delay * 1000);
+                const current = document.body.scrollHeight;
+                if (current === last) break;
+                last = current;
             }
         }
     """
-    page.evaluate(script, {"step": step, "delay": delay})
-def reset_scroll(page):
+    await page.evaluate(script, {"delay": delay, "timeout": timeout})
+async def prepare_capture(page):
     """
-    Reset the scroll parent element's height and overflow to ensure full-page screenshots.
+    Reset the scroll parent element's height and overflow to ensure full-page screenshots,
+    and return the body text in the same round trip.
     """
-    page.evaluate("""
+    return await page.evaluate("""
     () => {
-        const scrollBox = document.querySelector('.tui-scrollbar__container');
-        if (scrollBox) {
+        document.querySelectorAll('.tui-scrollbar__container').forEach(scrollBox => {
             scrollBox.style.height = 'auto';
             scrollBox.style.maxHeight = 'none';
             scrollBox.style.overflow = 'visible';
-        }
+        });
         document.body.style.overflow = 'visible';
         document.documentElement.style.overflow = 'visible';
+        return document.body.innerText;
     }
     """)
-def scrape_1inch_docs(
+async def open_doc_page(page, url: str, timeout: int = NAVIGATION_TIMEOUT) -> bool:
+    """
+    ナビゲーションはcommitで切り上げ、networkidleではなく本文の描画だけを待つ。
+    commitまでにtimeoutを超えたらFIRST_NAVIGATION_TIMEOUTで1回だけやり直し、
+    それでも駄目ならそのページは諦めてFalseを返す。
+    """
+    try:
+        await page.goto(url, wait_until="commit", timeout=timeout)
+    except PlaywrightTimeoutError:
+        if timeout >= FIRST_NAVIGATION_TIMEOUT:
+            print(f"⚠️ Navigation timed out, skipping: {url}")
+            return False
+        print(f"⚠️ Navigation slow, retrying: {url}")
+        return await open_doc_page(page, url, timeout=FIRST_NAVIGATION_TIMEOUT)
+    try:
+        await page.wait_for_selector(CONTENT_SELECTOR, timeout=CONTENT_TIMEOUT)
+    except Exception as e:
+        print(f"⚠️ Content not found, continuing: {url} ({e})")
+    return True
+async def dismiss_overlays(page, popup_timeout: int = 3000):
+    """
+    Cookie同意とポップアップを閉じる。Cookieはコンテキスト内で共有される。
+    popup_timeout=0なら待たずに、今表示されているポップアップだけを閉じる。
+    """
+    # Cookie同意ボタン
+    try:
+        agree_button = page.locator("button:has-text('I agree')")
+        if await agree_button.count() > 0:
+            print("🍪 Cookie consent found. Clicking 'I agree'.")
+            await agree_button.first.click()
+            # バナーが消えるまで待つ
+            await agree_button.first.wait_for(state="hidden", timeout=10000)
+    except Exception as e:
+        print(f"Cookie consent check failed: {e}")
+    # ポップアップのXボタンをクリック
+    popup_close = page.locator(POPUP_CLOSE_SELECTOR).first
+    try:
+        if popup_timeout:
+            await popup_close.click(timeout=popup_timeout)
+        elif await popup_close.count() > 0:
+            await popup_close.click()
+        else:
+            return
+        print("🦄 Popup closed")
+    except Exception as e:
+        print("🦄 Popup not found, skipping", e)
+async def collect_doc_urls(page):
+    """
+    "Next"リンクを辿ってURL一覧を作る（スクロールや保存はしない）。
+    最後のページまで辿れたかどうかも返す。
+    """
+    urls = []
+    while True:
+        current_url = page.url
+        if current_url in urls:
+            print(":warning: 同じURLに戻ったため終了します")
+            return urls, True
+        urls.append(current_url)
+        # "Next"リンク
+        next_link = page.locator("dev-portal-documentation-pagination >> text=Next")
+        if await next_link.count() == 0:
+            print("✅ Next link not found. URL list complete.")
+            return urls, True
+        next_text = await next_link.last.inner_text()
+        print(f"➡️ Clicking Next link: {next_text}")
+        prev_url = page.url
+        prev_pagination = await page.locator(CONTENT_SELECTOR).last.inner_text()
+        await next_link.last.click()
+        # URL変化を待つ
+        try:
+            await page.wait_for_url(lambda url: url != prev_url, timeout=10000)
+        except PlaywrightTimeoutError:
+            print("⚠️ Timeout waiting for URL change. Stopping.")
+            return urls, False
+        # SPAなのでURLが変わっても前のページのページ送りが残っていることがある。
+        # 新しいページのページ送りに描画し直されるまで待つ
+        try:
+            await page.wait_for_function(
+                """([selector, previous]) => {
+                    const found = document.querySelectorAll(selector);
+                    return found.length > 0 && found[found.length - 1].innerText !== previous;
+                }""",
+                arg=[CONTENT_SELECTOR, prev_pagination],
+                timeout=CONTENT_TIMEOUT
+            )
+        except PlaywrightTimeoutError:
+            print("⚠️ Timeout waiting for pagination to update. Stopping.")
+            return urls, False
+def load_cached_urls(base_url: str, cache_path: Path = URL_CACHE_PATH, ttl: int = URL_CACHE_TTL):
+    """
+    base_urlから辿ったURL一覧のキャッシュを返す。無いか期限切れならNone。
+    """
+    cache_path = Path(cache_path)
+    if not cache_path.exists():
+        return None
+    try:
+        entry = json.loads(cache_path.read_text(encoding="utf-8")).get(base_url)
+    except (OSError, ValueError) as e:
+        print(f"URL cache read failed: {e}")
+        return None
+    if entry is None or time.time() - entry["saved_at"] >= ttl:
+        return None
+    return entry["urls"]
+def save_cached_urls(base_url: str, urls: list, cache_path: Path = URL_CACHE_PATH):
+    """
+    base_urlから辿ったURL一覧をキャッシュに書き込む
+    """
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    cache = {}
+    if cache_path.exists():
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            cache = {}
+    cache[base_url] = {"saved_at": time.time(), "urls": urls}
+    cache_path.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding="utf-8")
+def load_manifest(output_dir: Path) -> dict:
+    """
+    前回実行時のページごとのHTMLハッシュと保存ファイルを読み込む
+    """
+    manifest_path = output_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"Manifest read failed, re-rendering all pages: {e}")
+        return {}
+def save_manifest(output_dir: Path, manifest: dict):
+    manifest_path = output_dir / MANIFEST_NAME
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+def content_hash(html: str) -> str:
+    return hashlib.blake2b(html.encode(), digest_size=16).hexdigest()
+def unchanged_paths(manifest: dict, url: str, html_hash: str, page_num: int, output_dir: Path, save_png: bool):
+    """
+    HTMLが前回と同じで保存ファイル（テキストを含む）も残っていれば、テキスト以外のパスを返す。
+    再描画が必要ならNone。ファイル名はページ番号で決まるので、今回のページ番号と同じ名前の時だけ使い回す。
+    """
+    entry = manifest.get(url)
+    if entry is None or entry["hash"] != html_hash or "title" not in entry:
+        return None
+    safe_base = safe_filename(f"{page_num:02d}_{entry['title']}")
+    paths = [output_dir / name for name in entry["files"]]
+    if not all(path.stem == safe_base for path in paths):
+        return None
+    if not all(path.exists() for path in paths):
+        return None
+    if not any(path.suffix == ".txt" for path in paths):
+        return None
+    if save_png and not any(path.suffix == ".png" for path in paths):
+        return None
+    return [path for path in paths if path.suffix != ".txt"]
+def record_capture(manifest: dict, url: str, html_hash: str, title: str, saved_paths: list):
+    """
+    保存したファイルをmanifestに記録する。同じファイル名を指していた他のURLの記録は
+    上書きされた古い内容を指すことになるので消す。
+    """
+    names = [path.name for path in saved_paths]
+    for other_url in [u for u, entry in manifest.items() if u != url and set(entry["files"]) & set(names)]:
+        del manifest[other_url]
+    manifest[url] = {"hash": html_hash, "title": title, "files": names}
+def make_http_client():
+    """
+    変更検出用のHTTPクライアントを作る。
+    httpxが無ければNone（ブラウザだけで比較する）、h2が無ければHTTP/1.1で接続する。
+    HTTP/2を使うには pip install "httpx[http2]"
+    """
+    try:
+        import httpx
+    except ImportError:
+        print("httpx not installed, detecting changes with the browser only")
+        return None
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(max_connections=20),
+        follow_redirects=True,
+        timeout=10
+    )
+async def fetch_ssr_html(client, url: str):
+    """
+    ブラウザを使わずHTMLを取得する。サーバー側で描画済みのページでなければNone。
+    """
+    import httpx
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"HTTP fetch failed, using browser: {url} ({e})")
+        return None
+    html = response.text
+    if len(html) > SSR_MIN_BYTES and "<main" in html:
+        return html
+    return None
+async def finish_capture(writes: list, saved_paths: list, manifest: dict = None, record: tuple = None):
+    """
+    capture_pageが始めたファイル書き込みを待ち、manifestに記録して保存したパスを返す
+    """
+    await asyncio.gather(*writes)
+    if manifest is not None and record is not None:
+        record_capture(manifest, *record)
+    return saved_paths
+async def capture_page(page, url: str, page_num: int, output_dir: Path, executor,
+                       save_png: bool = False, manifest: dict = None, html_hash: str = None):
+    """
+    1ページ分のテキスト・PDF（save_pngならスクリーンショットも）を保存する。
+    ファイル書き込みはexecutorのスレッドで始めるだけで、書き込み完了を待つfinish_captureの
+    コルーチンを返す。ページを返却してから待てば、その間に次のページの処理を進められる。
+    ページを開けなかった場合は空のリストを返すコルーチンになる。
+    manifestを渡すと、スクロール後のテキストが前回から変わっていないページはPDF化せず前回のファイルを返す。
+    html_hashを渡した場合は比較済みとみなし、そのハッシュをmanifestに記録する。
+    """
+    loop = asyncio.get_running_loop()
+    if not await open_doc_page(page, url):
+        return finish_capture([], [])
+    # ポップアップはCookieに残らないことがあるので、ページごとに出ていれば閉じる
+    await dismiss_overlays(page, popup_timeout=0)
+    # --- ページ全体をスクロールして全要素を表示 ---
+    await scroll_to_bottom(page)
+    # Reset scroll settings before capturing the screenshot (the text comes back together)
+    page_text = await prepare_capture(page)
+    # Lazy Loadの内容も含めて比較するため、スクロール後のテキストでハッシュを取る。
+    # PDF・スクリーンショットの生成は省ける
+    if manifest is not None and html_hash is None:
+        html_hash = content_hash(page_text)
+        previous_paths = unchanged_paths(manifest, url, html_hash, page_num, output_dir, save_png)
+        if previous_paths is not None:
+            print(f"[{page_num}] Unchanged, skipping: {url}")
+            return finish_capture([], previous_paths)
+    title = (await page.title()).replace(" - 1inch Developer Portal", "")
+    safe_base = safe_filename(f"{page_num:02d}_{title}")
+    saved_paths = []
+    writes = []
+    # スクリーンショット（ページ全体）。PDFに同じ内容が入るので必要な時だけ
+    if save_png:
+        img_path = output_dir / f"{safe_base}.png"
+        print(f"[{page_num}] Saving screenshot: {img_path}")
+        png = await page.screenshot(full_page=True)
+        writes.append(loop.run_in_executor(executor, img_path.write_bytes, png))
+        saved_paths.append(img_path)
+    # ページ全体のテキストを保存
+    txt_path = output_dir / f"{safe_base}.txt"
+    writes.append(loop.run_in_executor(executor, partial(txt_path.write_text, page_text, encoding="utf-8")))
+    # ページ全体をPDFとして保存
+    pdf_path = output_dir / f"{safe_base}.pdf"
+    pdf = await page.pdf(format="A4")
+    writes.append(loop.run_in_executor(executor, pdf_path.write_bytes, pdf))
+    print(f"[{page_num}] Saving PDF: {pdf_path}")
+    saved_paths.append(pdf_path)
+    record = (url, html_hash, title, saved_paths + [txt_path])
+    return finish_capture(writes, saved_paths, manifest, record)
+def merge_pdfs(pdf_paths: list, merged_pdf_path: str):
+    """
+    ページごとのPDFを順番通りに1つのPDFへ結合する
+    """
+    writer = PdfWriter()
+    try:
+        for pdf_path in pdf_paths:
+            writer.append(pdf_path)
+        writer.write(merged_pdf_path)
+    finally:
+        writer.close()
+async def scrape_1inch_docs(
     base_url: str = BASE_URL,
-    output_dir: str = OUTPUT_DIR,
+    output_dir: Path = OUTPUT_DIR,
     merged_pdf_path: str = MERGED_PDF_PATH,
     headless: bool = False,
-    slow_mo: int = 500
+    slow_mo: int = 500,
+    urls: list = None,
+    max_concurrent: int = MAX_CONCURRENT,
+    jitter: float = JITTER,
+    url_cache_path: Path = URL_CACHE_PATH,
+    save_png: bool = False,
+    block_media: bool = False,
+    recycle_every: int = RECYCLE_EVERY,
+    incremental: bool = True
 ):
     """
     1inchのドキュメントをクロールして各ページをPDF化し、
     最後に1つのPDFに結合する。
+    urlsを渡さない場合はbase_urlから"Next"リンクを辿ってURL一覧を作り、
+    各ページはmax_concurrentページずつ並列に保存する。
+    辿ったURL一覧はurl_cache_pathに1日キャッシュする（Noneで無効）。
+    ページ全体のPNGはsave_png=Trueの時だけ保存する。
+    解析系ドメインは常に名前解決で止め、block_media=Trueなら画像・フォント・動画も止める。
+    長いクロールでメモリが膨らまないようrecycle_everyページごとにコンテキストを作り直す。
+    incremental=Trueなら、前回からHTMLが変わっていないページは描画し直さない。
+    サーバー側で描画済みのページはhttpxで取得したHTMLで比較し、変化が無ければブラウザを使わない。
     """
-    os.makedirs(output_dir, exist_ok=True)
-    pdf_paths = []
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless, slow_mo=slow_mo)
-        browser_context = browser.new_context(viewport={"width": 1600, "height": 12000})
-        page = browser.new_page()
-        page.goto(base_url, wait_until="networkidle")
-        # Cookie同意ボタン
-        try:
-            agree_button = page.locator("button:has-text('I agree')")
-            if agree_button.count() > 0:
-                print("🍪 Cookie consent found. Clicking 'I agree'.")
-                agree_button.first.click()
-                time.sleep(1)
-        except Exception as e:
-            print(f"Cookie consent check failed: {e}")
-        # ポップアップのXボタンをクリック
-        try:
-            page.click(
-                "#cdk-overlay-2 div.text-day-static-white.absolute.right-0.top-0.cursor-pointer.p-3.hover\\:opacity-50.ng-tns-c3156289045-3",
-                timeout=3000
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    executor = ThreadPoolExecutor(max_workers=2)
+    manifest = load_manifest(output_dir) if incremental else None
+    # PDFの描画にはブラウザが必要なので、HTTPでの取得は変更検出にだけ使う
+    client = make_http_client() if incremental else None
+    pool = PagePool(
+        partial(get_browser, headless=headless, slow_mo=slow_mo),
+        reuse_pages=True,
+        context_setup=partial(configure_context, block_media=block_media),
+        recycle_every=recycle_every,
+        viewport={"width": 1600, "height": 12000}
+    )
+    async def open_base_page(page):
+        if not await open_doc_page(page, base_url, timeout=FIRST_NAVIGATION_TIMEOUT):
+            raise RuntimeError(f"Could not open base_url: {base_url}")
+        await dismiss_overlays(page)
+    async def check_unchanged(i, url):
+        """
+        HTTPで取得したHTMLが前回と同じなら前回のファイル、違えば比較に使ったハッシュを返す
+        """
+        html = await fetch_ssr_html(client, url)
+        if html is None:
+            return None, None
+        html_hash = content_hash(html)
+        previous_paths = unchanged_paths(manifest, url, html_hash, STARTNUMBER + i, output_dir, save_png)
+        if previous_paths is not None:
+            print(f"[{STARTNUMBER + i}] Unchanged (HTTP), skipping: {url}")
+        return previous_paths, html_hash
+    try:
+        base_opened = False
+        if urls is None and url_cache_path:
+            urls = load_cached_urls(base_url, url_cache_path)
+            if urls is not None:
+                print(f"📦 Using cached URL list: {url_cache_path}")
+        if urls is None:
+            async with pool.acquire() as page:
+                await open_base_page(page)
+                base_opened = True
+                urls, complete = await collect_doc_urls(page)
+                # 途中で止まった一覧はキャッシュしない
+                if url_cache_path and complete:
+                    save_cached_urls(base_url, urls, url_cache_path)
+        print(f"🔗 {len(urls)} pages to capture")
+        # ブラウザを使う前にHTTPで変更を確認し、描画が必要なページだけを残す
+        checks = [(None, None)] * len(urls)
+        if client is not None:
+            checks = await asyncio.gather(
+                *[check_unchanged(i, url) for i, url in enumerate(urls)], return_exceptions=True
             )
-            print("🦄 Popup closed")
-        except Exception as e:
-            print("🦄 Popup not found, skipping", e)
-        page_num = STARTNUMBER
-        visited_urls = set()
-        while True:
-            current_url = page.url
-            if current_url in visited_urls:
-                print(":warning: 同じURLに戻ったため終了します")
-                break
-            visited_urls.add(current_url)
-            # --- ページ全体をスクロールして全要素を表示 ---
-            scroll_to_bottom(page)
-            # Reset scroll settings before capturing the screenshot
-            reset_scroll(page)
-            # ページ全体のスクリーンショット保存
-            full_height = page.evaluate("document.body.scrollHeight")
-            title = page.title().replace(" - 1inch Developer Portal", "")
-            safe_base = safe_filename(f"{page_num:02d}_{title}")
-            img_path = os.path.join(output_dir, safe_base + ".png")
-            txt_path = os.path.join(output_dir, safe_base + ".txt")
-            print(f"[{page_num}] Saving screenshot: {img_path}")
-            # スクリーンショット（ページ全体）
-            page.screenshot(path=img_path, full_page=True)
-            # ページ全体のテキストを取得して保存
-            page_text = page.evaluate("document.body.innerText")
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(page_text)
-            # スクリーンショット保存完了待機
-            for _ in range(50):
-                if os.path.exists(img_path) and os.path.getsize(img_path) > 0:
-                    break
-                time.sleep(0.1)
-            pdf_paths.append(img_path)
-            # ページ全体をPDFとして保存
-            pdf_path = os.path.join(output_dir, safe_base + ".pdf")
-            page.pdf(path=pdf_path, format="A4")
-            print(f"[{page_num}] Saving PDF: {pdf_path}")
-            # PDF保存完了待機
-            for _ in range(50):
-                if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
-                    break
-                time.sleep(0.1)
-            pdf_paths.append(pdf_path)
-            # "Next"リンク
-            next_link = page.locator("dev-portal-documentation-pagination >> text=Next")
-            if next_link.count() == 0:
-                print("✅ Next link not found. Finished scraping.")
-                break
-            next_text = next_link.last.inner_text()
-            print(f"➡️ Clicking Next link: {next_text}")
-            prev_url = page.url
-            next_link.last.click()
-            # URL変化を待つ
-            try:
-                page.wait_for_url(lambda url: url != prev_url, timeout=10000)
-            except:
-                print("⚠️ Timeout waiting for URL change. Stopping.")
-                break
-            page_num += 1
-        browser.close()
-    print("\n🎉 All screenshots and text files saved in: {output_dir}")
+            checks = [(None, None) if isinstance(check, Exception) else check for check in checks]
+        results = [previous_paths for previous_paths, _ in checks]
+        pending = [i for i, (previous_paths, _) in enumerate(checks) if previous_paths is None]
+        if not pending:
+            print("✅ All pages unchanged, browser not needed")
+        else:
+            if not base_opened:
+                async with pool.acquire() as page:
+                    await open_base_page(page)
+            await pool.warm_up(min(len(pending), max_concurrent))
+            semaphore = asyncio.Semaphore(max_concurrent)
+            async def render(n, i):
+                async with semaphore:
+                    # 最初のページ群はレンダリングが重ならないよう開始をずらす
+                    if n < max_concurrent:
+                        await asyncio.sleep(n * jitter)
+                    async with pool.acquire() as page:
+                        finish = await capture_page(
+                            page, urls[i], STARTNUMBER + i, output_dir, executor, save_png, manifest, checks[i][1]
+                        )
+                # ページと同時実行枠を返してからファイル書き込みの完了を待つ
+                return await finish
+            # 1ページの失敗で他のページを途中で止めないよう、例外も結果として受け取る
+            rendered = await asyncio.gather(
+                *[render(n, i) for n, i in enumerate(pending)], return_exceptions=True
+            )
+            for i, result in zip(pending, rendered):
+                results[i] = result
+    finally:
+        await pool.close()
+        if client is not None:
+            await client.aclose()
+        executor.shutdown()
+        if manifest is not None:
+            save_manifest(output_dir, manifest)
+    failed = [(url, result) for url, result in zip(urls, results)
+              if isinstance(result, BaseException) or not result]
+    for url, error in failed:
+        print(f"❌ Failed: {url} ({error!r})" if error else f"❌ Failed: {url} (navigation timed out)")
+    pdf_paths = [path for result in results if not isinstance(result, BaseException) for path in result]
+    print(f"\n🎉 {len(urls) - len(failed)}/{len(urls)} pages saved in: {output_dir}")
+    merge_pdfs([path for path in pdf_paths if path.suffix == ".pdf"], merged_pdf_path)
+    print(f"📚 Merged PDF saved: {merged_pdf_path}")
     return pdf_paths
+async def main():
+    try:
+        await scrape_1inch_docs()
+    finally:
+        await close_browser()
 if __name__ == "__main__":
-    scrape_1inch_docs()
\ No newline at end of file
+    asyncio.run(main())